@@ -0,0 +1,32 @@
+"""
+Database access for bills.
+
+The driver is chosen once at import time from DATABASE_URL: a postgres:// or
+postgresql:// URL selects asyncpg, a sqlite: URL selects a local SQLite file.
+Only the selected backend's driver is imported.
+"""
+import os
+
+from ._errors import BillNotFound
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    raise RuntimeError("DATABASE_URL environment variable not set")
+
+if DATABASE_URL.startswith(("postgres://", "postgresql://")):
+    from ._pg import (
+        create_pool, close_pool, init_db, insert_bill, get_all_bills, delete_bill, get_insights,
+        get_extraction, save_extraction
+    )
+elif DATABASE_URL.startswith("sqlite:"):
+    from ._sqlite import (
+        create_pool, close_pool, init_db, insert_bill, get_all_bills, delete_bill, get_insights,
+        get_extraction, save_extraction
+    )
+else:
+    raise RuntimeError("DATABASE_URL must be a postgres://, postgresql:// or sqlite: URL")
+
+__all__ = [
+    "BillNotFound", "create_pool", "close_pool", "init_db", "insert_bill", "get_all_bills",
+    "delete_bill", "get_insights", "get_extraction", "save_extraction"
+]
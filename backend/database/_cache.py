@@ -0,0 +1,39 @@
+from datetime import date
+from typing import Optional
+
+import cachetools
+
+# Insights are cached per data generation: (max(id), count(*)) of the bills
+# table. Ids are never reused, so any insert or delete in any worker process
+# changes it, and every worker reads it from the database before consulting
+# its cache. The TTL only drops results for generations nobody asks for.
+INSIGHTS_TTL = 30
+GENERATION_SQL = "SELECT max(id), count(*) FROM bills"
+
+_insights_cache = cachetools.TTLCache(maxsize=2, ttl=INSIGHTS_TTL)  # (generation, month) -> (insights, etag)
+
+
+def cached_insights(generation: tuple, month: str) -> Optional[tuple]:
+    """Return (insights, etag) for a data generation, or None on a cache miss."""
+    return _insights_cache.get((generation, month))
+
+
+def store_insights(generation: tuple, month: str, insights: dict) -> str:
+    """Cache insights computed at the given data generation and return their ETag."""
+    # Derived from the data alone, so every worker hands out the same tag
+    max_id, count = generation
+    etag = f'W/"{month}-{max_id or 0}-{count}"'
+    _insights_cache[(generation, month)] = (insights, etag)
+    return etag
+
+
+def year_before(day: date) -> date:
+    """The same day twelve months earlier (Feb 29 maps to Feb 28).
+
+    Backends take the insights cutoff from this rather than the database's
+    clock, so it follows the same local date as the cached month key.
+    """
+    try:
+        return day.replace(year=day.year - 1)
+    except ValueError:
+        return day.replace(year=day.year - 1, day=28)
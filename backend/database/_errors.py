@@ -0,0 +1,6 @@
+class BillNotFound(Exception):
+    """Raised when a bill ID does not exist."""
+
+    def __init__(self, bill_id: int):
+        super().__init__(f"Bill {bill_id} not found")
+        self.bill_id = bill_id
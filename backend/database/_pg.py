@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+from datetime import date as Date, datetime
+from typing import Optional
+
+import asyncpg
+
+from ._cache import GENERATION_SQL, cached_insights, store_insights, year_before
+from ._errors import BillNotFound
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+logger = logging.getLogger(__name__)
+
+# Pool sizing per worker process. Behind PgBouncer in transaction mode the
+# bouncer is the real pool, so keep these small and disable asyncpg's
+# prepared-statement cache (DB_STATEMENT_CACHE_SIZE=0).
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "5"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "20"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+
+async def create_pool() -> asyncpg.Pool:
+    """Create the shared connection pool."""
+    return await asyncpg.create_pool(
+        dsn=DATABASE_URL,
+        min_size=min(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE),
+        max_size=DB_POOL_MAX_SIZE,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+    )
+
+
+async def close_pool(pool: asyncpg.Pool):
+    """Close the connection pool."""
+    await pool.close()
+
+
+async def init_db(pool: asyncpg.Pool):
+    """Initialize the database with the bills table."""
+    async with pool.acquire() as conn:
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS bills (
+                id SERIAL PRIMARY KEY,
+                date DATE,
+                vendor TEXT,
+                category TEXT,
+                amount REAL,
+                image_path TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # Migrate tables created before date was stored as DATE; the cast
+        # then happens once here instead of per row on every insights query.
+        if await _date_column_type(conn) == "text":
+            await _migrate_text_dates(conn)
+        # Serves the insights date range directly from the index; amount is
+        # included so aggregates are index-only scans.
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS bills_date_cat_amount
+            ON bills (date DESC, category) INCLUDE (amount)
+        """)
+        # Backs the stable (date, id) ordering used to page through bills
+        await conn.execute("CREATE INDEX IF NOT EXISTS bills_date_id ON bills (date DESC, id DESC)")
+        # AI extraction results keyed by the uploaded image's content hash
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS bill_extractions (
+                hash TEXT PRIMARY KEY,
+                payload JSONB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+
+async def _date_column_type(conn: asyncpg.Connection) -> Optional[str]:
+    return await conn.fetchval("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'bills' AND column_name = 'date'
+    """)
+
+
+async def _migrate_text_dates(conn: asyncpg.Connection):
+    """Convert a legacy TEXT bills.date column to DATE.
+
+    Values that do not parse as a date become NULL and are counted in a
+    warning, so one bad legacy row cannot keep the app from starting.
+    """
+    async with conn.transaction():
+        # Every worker runs init_db at startup; the first to get the lock
+        # migrates, and the rest find the column already converted
+        await conn.execute("LOCK TABLE bills IN ACCESS EXCLUSIVE MODE")
+        if await _date_column_type(conn) != "text":
+            return
+        await conn.execute("""
+            CREATE FUNCTION pg_temp.bills_try_date(value TEXT) RETURNS DATE
+            LANGUAGE plpgsql IMMUTABLE AS $$
+            BEGIN
+                RETURN NULLIF(value, '')::date;
+            EXCEPTION WHEN invalid_datetime_format OR datetime_field_overflow THEN
+                RETURN NULL;
+            END
+            $$
+        """)
+        unparseable = await conn.fetchval("""
+            SELECT count(*) FROM bills
+            WHERE date <> '' AND pg_temp.bills_try_date(date) IS NULL
+        """)
+        if unparseable:
+            logger.warning("Setting date to NULL on %s bills whose date could not be parsed", unparseable)
+        await conn.execute("ALTER TABLE bills ALTER COLUMN date TYPE DATE USING pg_temp.bills_try_date(date)")
+        await conn.execute("DROP FUNCTION pg_temp.bills_try_date(TEXT)")
+
+
+async def insert_bill(pool: asyncpg.Pool, date: Date, vendor: str, category: str, amount: float, image_path: str) -> dict:
+    """Insert a new bill into the database."""
+    # asyncpg prepares and caches the statement per connection and sends the
+    # date in binary; only the server-generated columns come back, the rest
+    # is what the caller sent.
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            """
+            INSERT INTO bills (date, vendor, category, amount, image_path)
+            VALUES ($1, $2, $3, $4, $5)
+            RETURNING id, created_at
+            """,
+            date, vendor, category, amount, image_path
+        )
+    return {
+        "id": row["id"],
+        "date": date,
+        "vendor": vendor,
+        "category": category,
+        "amount": amount,
+        "image_path": image_path,
+        "created_at": row["created_at"]
+    }
+
+
+async def get_all_bills(pool: asyncpg.Pool, limit: Optional[int] = None, offset: int = 0) -> list:
+    """
+    Get bills ordered by date descending, newest first. The page is fetched
+    in full so the connection goes back to the pool before the response is
+    sent.
+    """
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            "SELECT * FROM bills ORDER BY date DESC, id DESC LIMIT $1 OFFSET $2",
+            limit, offset
+        )
+    return [dict(row) for row in rows]
+
+
+async def delete_bill(pool: asyncpg.Pool, bill_id: int):
+    """Delete a bill by ID. Raises BillNotFound if it does not exist."""
+    async with pool.acquire() as conn:
+        status = await conn.execute("DELETE FROM bills WHERE id = $1", bill_id)
+    # execute() returns the command tag, e.g. "DELETE 1"
+    if status.split()[-1] == "0":
+        raise BillNotFound(bill_id)
+
+
+async def get_extraction(pool: asyncpg.Pool, digest: str) -> Optional[dict]:
+    """Get the stored extraction for an image hash, if any."""
+    async with pool.acquire() as conn:
+        payload = await conn.fetchval("SELECT payload FROM bill_extractions WHERE hash = $1", digest)
+    return json.loads(payload) if payload is not None else None
+
+
+async def save_extraction(pool: asyncpg.Pool, digest: str, data: dict):
+    """Store the extraction for an image hash."""
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """
+            INSERT INTO bill_extractions (hash, payload) VALUES ($1, $2::jsonb)
+            ON CONFLICT (hash) DO UPDATE SET payload = EXCLUDED.payload
+            """,
+            digest, json.dumps(data)
+        )
+
+
+async def get_insights(pool: asyncpg.Pool) -> tuple:
+    """Get spending insights as (insights, etag)."""
+    now = datetime.now()
+    current_month = now.strftime("%Y-%m")
+    month_start = now.date().replace(day=1)
+    year_start = now.date().replace(month=1, day=1)
+    cutoff = year_before(now.date())
+
+    async with pool.acquire() as conn:
+        generation = tuple(await conn.fetchrow(GENERATION_SQL))
+        cached = cached_insights(generation, current_month)
+        if cached is not None:
+            return cached
+
+        # All aggregates come from a single pass over the relevant rows, returned
+        # as one row so the dashboard costs one round-trip instead of six.
+        row = await conn.fetchrow("""
+            WITH cutoff AS (
+                SELECT $3::date as day
+            ),
+            b AS (
+                SELECT
+                    date_trunc('month', date)::date as month,
+                    category,
+                    amount,
+                    date >= cutoff.day as recent
+                FROM bills, cutoff
+                WHERE date >= LEAST(cutoff.day, $2::date)
+            ),
+            mc AS (
+                SELECT month, category, recent, SUM(amount) as total, COUNT(*) as count
+                FROM b
+                GROUP BY month, category, recent
+            )
+            SELECT
+                -- Spending by category for current month
+                (SELECT COALESCE(json_agg(t ORDER BY t.total DESC), '[]')
+                 FROM (SELECT category, SUM(total) as total FROM mc
+                       WHERE month = $1::date GROUP BY category) t) as spending_by_category,
+                -- Spending by category for current year
+                (SELECT COALESCE(json_agg(t ORDER BY t.total DESC), '[]')
+                 FROM (SELECT category, SUM(total) as total FROM mc
+                       WHERE date_trunc('year', month)::date = $2::date GROUP BY category) t) as spending_by_category_year,
+                -- Monthly trend for last 12 months
+                (SELECT COALESCE(json_agg(t ORDER BY t.month ASC), '[]')
+                 FROM (SELECT TO_CHAR(month, 'YYYY-MM') as month, SUM(total) as total FROM mc
+                       WHERE recent GROUP BY mc.month) t) as monthly_trend,
+                -- Total this month
+                (SELECT COALESCE(SUM(total), 0) FROM mc WHERE month = $1::date) as total_this_month,
+                -- Total this year
+                (SELECT COALESCE(SUM(total), 0) FROM mc WHERE date_trunc('year', month)::date = $2::date) as total_this_year,
+                -- Monthly breakdown with category details (last 12 months),
+                -- one entry per month with its categories nested
+                (SELECT COALESCE(json_agg(m ORDER BY m.month DESC), '[]')
+                 FROM (SELECT TO_CHAR(month, 'YYYY-MM') as month, SUM(total) as total,
+                              json_agg(json_build_object('category', category, 'total', total, 'count', count)
+                                       ORDER BY total DESC) as categories
+                       FROM (SELECT month, category, SUM(total) as total, SUM(count) as count FROM mc
+                             WHERE recent GROUP BY month, category) t
+                       GROUP BY t.month) m) as monthly_breakdown
+        """, month_start, year_start, cutoff)
+
+    spending_by_category = json.loads(row["spending_by_category"])
+    spending_by_category_year = json.loads(row["spending_by_category_year"])
+    monthly_trend = json.loads(row["monthly_trend"])
+    total_this_month = row["total_this_month"]
+    total_this_year = row["total_this_year"]
+    monthly_breakdown = json.loads(row["monthly_breakdown"])
+
+    # Top category this month (fallback to year if month is empty)
+    if spending_by_category:
+        top_category = spending_by_category[0]["category"]
+    elif spending_by_category_year:
+        top_category = spending_by_category_year[0]["category"]
+    else:
+        top_category = None
+
+    insights = {
+        "spending_by_category": spending_by_category,
+        "spending_by_category_year": spending_by_category_year,
+        "monthly_trend": monthly_trend,
+        "top_category_this_month": top_category,
+        "total_this_month": total_this_month,
+        "total_this_year": total_this_year,
+        "monthly_breakdown": monthly_breakdown
+    }
+    return insights, store_insights(generation, current_month, insights)
@@ -0,0 +1,293 @@
+import asyncio
+import json
+import os
+import queue
+import sqlite3
+import threading
+from datetime import date as Date, datetime
+from typing import Optional
+
+from ._cache import GENERATION_SQL, cached_insights, store_insights, year_before
+from ._errors import BillNotFound
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "bills.db")
+# sqlite:///relative.db, sqlite:////absolute/bills.db, or a bare sqlite:// for the default
+DB_PATH = (
+    os.environ["DATABASE_URL"].partition(":")[2].removeprefix("//").removeprefix("/")
+    or DEFAULT_DB_PATH
+)
+
+# Readers per worker; WAL lets them run alongside the single writer
+SQLITE_READERS = int(os.getenv("SQLITE_READERS", "4"))
+
+
+def get_connection(db_path: str) -> sqlite3.Connection:
+    """Get a database connection."""
+    conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    # Per-connection tuning for a read-heavy workload: WAL (set on the
+    # writer at startup) makes NORMAL sync safe, and mmap lets insights scans
+    # read pages straight from the OS page cache. busy_timeout waits out a
+    # locked database instead of failing with "database is locked".
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")  # 64 MiB
+    return conn
+
+
+class SQLitePool:
+    """One writer connection plus a fixed set of reader connections."""
+
+    def __init__(self, db_path: str, readers: int):
+        self.writer = get_connection(db_path)
+        # WAL is persistent in the database file; readers no longer block on the writer
+        self.writer.execute("PRAGMA journal_mode=WAL")
+        self._write_lock = threading.Lock()
+        self._readers = queue.SimpleQueue()
+        self._reader_count = readers
+        for _ in range(readers):
+            conn = get_connection(db_path)
+            conn.execute("PRAGMA query_only=ON")
+            self._readers.put(conn)
+
+    def write(self, fn, *args):
+        """Run fn(conn, *args) in a write transaction on the writer connection."""
+        with self._write_lock:
+            # Take the write lock up front so the transaction never has to
+            # upgrade from a read lock, which is what raises SQLITE_BUSY
+            self.writer.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self.writer, *args)
+            except BaseException:
+                self.writer.execute("ROLLBACK")
+                raise
+            self.writer.execute("COMMIT")
+            return result
+
+    def read(self, fn, *args):
+        """Run fn(conn, *args) on a reader connection, waiting for a free one."""
+        conn = self._readers.get()
+        try:
+            return fn(conn, *args)
+        finally:
+            self._readers.put(conn)
+
+    def close(self):
+        for _ in range(self._reader_count):
+            self._readers.get().close()
+        with self._write_lock:
+            self.writer.close()
+
+
+async def _write(fn, pool: SQLitePool, *args):
+    """Run a write in a worker thread."""
+    return await asyncio.to_thread(pool.write, fn, *args)
+
+
+async def _read(fn, pool: SQLitePool, *args):
+    """Run a read in a worker thread."""
+    return await asyncio.to_thread(pool.read, fn, *args)
+
+
+async def create_pool() -> SQLitePool:
+    """Open this worker's writer and reader connections."""
+    return await asyncio.to_thread(SQLitePool, DB_PATH, SQLITE_READERS)
+
+
+async def close_pool(pool: SQLitePool):
+    """Close all connections."""
+    await asyncio.to_thread(pool.close)
+
+
+def _init_db(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bills (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT,
+            vendor TEXT,
+            category TEXT,
+            amount REAL,
+            image_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # ISO dates sort lexically, so this serves the paged (date, id) ordering
+    # and the insights date range
+    conn.execute("CREATE INDEX IF NOT EXISTS bills_date_id ON bills (date DESC, id DESC)")
+    # AI extraction results keyed by the uploaded image's content hash
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bill_extractions (
+            hash TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+async def init_db(pool: SQLitePool):
+    """Initialize the database with the bills table."""
+    await _write(_init_db, pool)
+
+
+def _insert_bill(conn: sqlite3.Connection, date: str, vendor: str, category: str, amount: float, image_path: str) -> dict:
+    cursor = conn.execute(
+        """
+        INSERT INTO bills (date, vendor, category, amount, image_path)
+        VALUES (?, ?, ?, ?, ?)
+        RETURNING id, created_at
+        """,
+        (date, vendor, category, amount, image_path)
+    )
+    row = cursor.fetchone()
+    return {
+        "id": row["id"],
+        "date": date,
+        "vendor": vendor,
+        "category": category,
+        "amount": amount,
+        "image_path": image_path,
+        "created_at": row["created_at"]
+    }
+
+
+async def insert_bill(pool: SQLitePool, date: Date, vendor: str, category: str, amount: float, image_path: str) -> dict:
+    """Insert a new bill into the database."""
+    # Stored as ISO text, which sorts and compares correctly
+    bill = await _write(_insert_bill, pool, date.isoformat(), vendor, category, amount, image_path)
+    return bill
+
+
+def _get_all_bills(conn: sqlite3.Connection, limit: Optional[int], offset: int) -> list:
+    rows = conn.execute(
+        "SELECT * FROM bills ORDER BY date DESC, id DESC LIMIT ? OFFSET ?",
+        (-1 if limit is None else limit, offset)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+async def get_all_bills(pool: SQLitePool, limit: Optional[int] = None, offset: int = 0) -> list:
+    """Get bills ordered by date descending, newest first."""
+    return await _read(_get_all_bills, pool, limit, offset)
+
+
+def _delete_bill(conn: sqlite3.Connection, bill_id: int) -> bool:
+    cursor = conn.execute("DELETE FROM bills WHERE id = ?", (bill_id,))
+    return cursor.rowcount > 0
+
+
+async def delete_bill(pool: SQLitePool, bill_id: int):
+    """Delete a bill by ID. Raises BillNotFound if it does not exist."""
+    if not await _write(_delete_bill, pool, bill_id):
+        raise BillNotFound(bill_id)
+
+
+def _get_extraction(conn: sqlite3.Connection, digest: str) -> Optional[str]:
+    row = conn.execute("SELECT payload FROM bill_extractions WHERE hash = ?", (digest,)).fetchone()
+    return row["payload"] if row is not None else None
+
+
+async def get_extraction(pool: SQLitePool, digest: str) -> Optional[dict]:
+    """Get the stored extraction for an image hash, if any."""
+    payload = await _read(_get_extraction, pool, digest)
+    return json.loads(payload) if payload is not None else None
+
+
+def _save_extraction(conn: sqlite3.Connection, digest: str, payload: str):
+    conn.execute("INSERT OR REPLACE INTO bill_extractions (hash, payload) VALUES (?, ?)", (digest, payload))
+
+
+async def save_extraction(pool: SQLitePool, digest: str, data: dict):
+    """Store the extraction for an image hash."""
+    await _write(_save_extraction, pool, digest, json.dumps(data))
+
+
+def _get_insights(conn: sqlite3.Connection, current_month: str, current_year: str, cutoff: str) -> dict:
+    # Same single-pass shape as the Postgres query. Dates are ISO text, so the
+    # month is a plain substr() and the range filter can use the date index.
+    row = conn.execute("""
+        WITH cutoff AS (
+            SELECT :cutoff as day
+        ),
+        b AS (
+            SELECT
+                substr(date, 1, 7) as month,
+                category,
+                amount,
+                date >= cutoff.day as recent
+            FROM bills, cutoff
+            WHERE date >= MIN(cutoff.day, :year || '-01-01')
+        ),
+        mc AS (
+            SELECT month, category, recent, SUM(amount) as total, COUNT(*) as count
+            FROM b
+            GROUP BY month, category, recent
+        )
+        SELECT
+            -- Spending by category for current month
+            (SELECT json_group_array(json_object('category', category, 'total', total))
+             FROM (SELECT category, SUM(total) as total FROM mc
+                   WHERE month = :month GROUP BY category ORDER BY total DESC)) as spending_by_category,
+            -- Spending by category for current year
+            (SELECT json_group_array(json_object('category', category, 'total', total))
+             FROM (SELECT category, SUM(total) as total FROM mc
+                   WHERE substr(month, 1, 4) = :year GROUP BY category ORDER BY total DESC)) as spending_by_category_year,
+            -- Monthly trend for last 12 months
+            (SELECT json_group_array(json_object('month', month, 'total', total))
+             FROM (SELECT month, SUM(total) as total FROM mc
+                   WHERE recent GROUP BY month ORDER BY month ASC)) as monthly_trend,
+            -- Total this month
+            (SELECT COALESCE(SUM(total), 0) FROM mc WHERE month = :month) as total_this_month,
+            -- Total this year
+            (SELECT COALESCE(SUM(total), 0) FROM mc WHERE substr(month, 1, 4) = :year) as total_this_year,
+            -- Monthly breakdown with category details (last 12 months),
+            -- one entry per month with its categories nested
+            (SELECT json_group_array(json_object('month', month, 'total', total, 'categories', json(categories)))
+             FROM (SELECT month, SUM(total) as total,
+                          json_group_array(json_object('category', category, 'total', total, 'count', count)) as categories
+                   FROM (SELECT month, category, SUM(total) as total, SUM(count) as count FROM mc
+                         WHERE recent GROUP BY month, category ORDER BY month, total DESC)
+                   GROUP BY month ORDER BY month DESC)) as monthly_breakdown
+    """, {"month": current_month, "year": current_year, "cutoff": cutoff}).fetchone()
+
+    spending_by_category = json.loads(row["spending_by_category"])
+    spending_by_category_year = json.loads(row["spending_by_category_year"])
+
+    # Top category this month (fallback to year if month is empty)
+    if spending_by_category:
+        top_category = spending_by_category[0]["category"]
+    elif spending_by_category_year:
+        top_category = spending_by_category_year[0]["category"]
+    else:
+        top_category = None
+
+    return {
+        "spending_by_category": spending_by_category,
+        "spending_by_category_year": spending_by_category_year,
+        "monthly_trend": json.loads(row["monthly_trend"]),
+        "top_category_this_month": top_category,
+        "total_this_month": row["total_this_month"],
+        "total_this_year": row["total_this_year"],
+        "monthly_breakdown": json.loads(row["monthly_breakdown"])
+    }
+
+
+def _get_generation(conn: sqlite3.Connection) -> tuple:
+    return tuple(conn.execute(GENERATION_SQL).fetchone())
+
+
+async def get_insights(pool: SQLitePool) -> tuple:
+    """Get spending insights as (insights, etag)."""
+    now = datetime.now()
+    current_month = now.strftime("%Y-%m")
+    current_year = now.strftime("%Y")
+
+    generation = await _read(_get_generation, pool)
+    cached = cached_insights(generation, current_month)
+    if cached is not None:
+        return cached
+
+    cutoff = year_before(now.date()).isoformat()
+    insights = await _read(_get_insights, pool, current_month, current_year, cutoff)
+    return insights, store_insights(generation, current_month, insights)
@@ -1,56 +1,89 @@
-import base64
-import json
+import asyncio
+import logging
 import os
-import requests
+from typing import Optional
+
+import httpx
+import orjson
+import pybase64
 
 NVIDIA_API_KEY = None
 INVOKE_URL = "https://integrate.api.nvidia.com/v1/chat/completions"
 MODEL_NAME = "mistralai/mistral-large-3-675b-instruct-2512"
 
+logger = logging.getLogger(__name__)
 
-def init_client(api_key: str):
-    """Initialize the NVIDIA API key."""
-    global NVIDIA_API_KEY
-    NVIDIA_API_KEY = api_key
+MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp"
+}
 
+SYSTEM_PROMPT = (
+    "You are a bill analysis assistant. Analyze the bill image and return ONLY a valid JSON object "
+    "with no extra text, no markdown, no code blocks, using this exact structure: "
+    '{"vendor_name": string, "category": one of [food, travel, utilities, shopping, healthcare, entertainment, other], '
+    '"date": "YYYY-MM-DD or null", "total_amount": number or null}. '
+    "Return ONLY the JSON object, nothing else."
+)
 
-def extract_bill_data(image_path: str) -> dict:
-    """
-    Extract bill data from an image using NVIDIA's Kimi K2.5 vision model.
+USER_TEXT = SYSTEM_PROMPT + " Please analyze this bill image and extract the vendor name, category, date, and total amount."
 
-    Returns a dict with: vendor_name, category, date, total_amount
+# Shared client so the TLS connection to the NVIDIA API is reused across
+# uploads; may be injected by the app so all outbound calls share one pool
+_http = None
+_owns_http = False
+_headers = None
+
+# Cap on extractions in flight per worker; each holds an encoded image in
+# memory and a slot on the NVIDIA API for up to a minute
+MAX_CONCURRENT_EXTRACTIONS = int(os.getenv("MAX_CONCURRENT_EXTRACTIONS", "8"))
+_slots = asyncio.Semaphore(MAX_CONCURRENT_EXTRACTIONS)
+
+
+def init_client(api_key: str, client: Optional[httpx.AsyncClient] = None):
+    """Initialize the NVIDIA API key and HTTP client.
+
+    Pass ``client`` to reuse an existing connection pool; otherwise a
+    dedicated client is created and closed by close_client().
     """
-    if NVIDIA_API_KEY is None:
-        raise ValueError("NVIDIA API key not initialized. Call init_client() first.")
+    global NVIDIA_API_KEY, _http, _owns_http, _headers
+    NVIDIA_API_KEY = api_key
+    _headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Accept": "application/json",
+        "Content-Type": "application/json"
+    }
+    _owns_http = client is None
+    _http = client or httpx.AsyncClient(
+        http2=True,
+        # Uploads are sporadic; httpx's default 5 s keep-alive would drop the
+        # connection between most of them and pay a fresh TLS handshake.
+        limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=60),
+    )
+
+
+async def close_client():
+    """Close the HTTP client if it was created by init_client()."""
+    global _http
+    if _http is not None and _owns_http:
+        await _http.aclose()
+    _http = None
 
-    # Read and base64 encode the image
+
+def _build_payload(image_path: str) -> bytes:
+    """Read and encode the image into a ready-to-send request body (CPU-bound)."""
+    # Read and base64 encode the image (SIMD-accelerated, straight to str)
     with open(image_path, "rb") as f:
-        image_data = base64.standard_b64encode(f.read()).decode("utf-8")
+        image_data = pybase64.b64encode_as_string(f.read())
 
     # Determine media type from file extension
     ext = os.path.splitext(image_path)[1].lower()
-    media_type_map = {
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".png": "image/png",
-        ".gif": "image/gif",
-        ".webp": "image/webp"
-    }
-    media_type = media_type_map.get(ext, "image/jpeg")
-
-    system_prompt = (
-        "You are a bill analysis assistant. Analyze the bill image and return ONLY a valid JSON object "
-        "with no extra text, no markdown, no code blocks, using this exact structure: "
-        '{"vendor_name": string, "category": one of [food, travel, utilities, shopping, healthcare, entertainment, other], '
-        '"date": "YYYY-MM-DD or null", "total_amount": number or null}. '
-        "Return ONLY the JSON object, nothing else."
-    )
+    media_type = MEDIA_TYPES.get(ext, "image/jpeg")
 
-    headers = {
-        "Authorization": f"Bearer {NVIDIA_API_KEY}",
-        "Accept": "application/json",
-        "Content-Type": "application/json"
-    }
+    logger.debug("Built NVIDIA API payload (image: %d bytes base64)", len(image_data))
 
     payload = {
         "model": MODEL_NAME,
@@ -66,7 +99,7 @@ def extract_bill_data(image_path: str) -> dict:
                     },
                     {
                         "type": "text",
-                        "text": system_prompt + " Please analyze this bill image and extract the vendor name, category, date, and total amount."
+                        "text": USER_TEXT
                     }
                 ]
             }
@@ -76,82 +109,109 @@ def extract_bill_data(image_path: str) -> dict:
         "top_p": 1.00,
         "stream": False
     }
+    # orjson encodes the multi-MB base64 string far faster than stdlib json
+    return orjson.dumps(payload)
 
-    try:
-        print(f"[DEBUG] Sending request to NVIDIA API...")
-        print(f"[DEBUG] Image size: {len(image_data)} bytes (base64)")
-        response = requests.post(INVOKE_URL, headers=headers, json=payload, timeout=60)
-        print(f"[DEBUG] Response status: {response.status_code}")
-
-        # Log full response for debugging
-        try:
-            resp_json = response.json()
-            print(f"[DEBUG] Response JSON: {json.dumps(resp_json, indent=2)[:1000]}")
-        except:
-            print(f"[DEBUG] Response text: {response.text[:1000]}")
-
-        response.raise_for_status()
-
-        result = response.json()
-
-        # Extract the response text - handle potential different response structures
-        message = result.get("choices", [{}])[0].get("message", {})
-        response_text = message.get("content", "")
-
-        # Some models return thinking + content separately
-        if not response_text and "reasoning_content" in message:
-            response_text = message.get("content", "") or ""
-
-        print(f"[DEBUG] Extracted content: {response_text[:500]}")
-
-        if not response_text:
-            return {
-                "vendor_name": None,
-                "category": "other",
-                "date": None,
-                "total_amount": None,
-                "extraction_success": False,
-                "error": "Model returned empty response"
-            }
 
-        response_text = response_text.strip()
-
-        # Try to extract JSON from the response
-        # Handle cases where model might wrap JSON in markdown code blocks
-        if "```" in response_text:
-            lines = response_text.split("\n")
-            json_lines = []
-            in_json = False
-            for line in lines:
-                if line.startswith("```") and not in_json:
-                    in_json = True
-                    continue
-                elif line.startswith("```") and in_json:
-                    break
-                elif in_json:
-                    json_lines.append(line)
-            if json_lines:
-                response_text = "\n".join(json_lines)
-
-        # Find JSON object in response if there's extra text
-        start_idx = response_text.find("{")
-        end_idx = response_text.rfind("}") + 1
-        if start_idx != -1 and end_idx > start_idx:
-            response_text = response_text[start_idx:end_idx]
-
-        print(f"[DEBUG] JSON to parse: {response_text[:500]}")
-        data = json.loads(response_text)
+async def _post(body: bytes) -> bytes:
+    """Send the request to NVIDIA API and return the raw response body."""
+    logger.debug("Sending request to NVIDIA API...")
+    response = await _http.post(INVOKE_URL, headers=_headers, content=body, timeout=60)
+    logger.debug("Response status: %s", response.status_code)
+
+    # Log the start of the response for debugging; skipped entirely unless
+    # debug logging is on
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Response body: %s", response.text[:1000])
+
+    response.raise_for_status()
+    return response.content
 
+
+def _parse(content: bytes) -> dict:
+    """Pull the bill fields out of the model's response (CPU-bound)."""
+    result = orjson.loads(content)
+
+    # Extract the response text - handle potential different response structures
+    message = result.get("choices", [{}])[0].get("message", {})
+    response_text = message.get("content", "")
+
+    # Some models return thinking + content separately
+    if not response_text and "reasoning_content" in message:
+        response_text = message.get("content", "") or ""
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Extracted content: %s", response_text[:500])
+
+    if not response_text:
         return {
-            "vendor_name": data.get("vendor_name"),
-            "category": data.get("category", "other"),
-            "date": data.get("date"),
-            "total_amount": data.get("total_amount"),
-            "extraction_success": True
+            "vendor_name": None,
+            "category": "other",
+            "date": None,
+            "total_amount": None,
+            "extraction_success": False,
+            "error": "Model returned empty response"
         }
 
-    except json.JSONDecodeError as e:
-        print(f"[DEBUG] JSON decode error: {e}")
+    response_text = response_text.strip()
+
+    # Try to extract JSON from the response
+    # Handle cases where model might wrap JSON in markdown code blocks
+    fence = response_text.find("```")
+    if fence != -1:
+        body_start = response_text.find("\n", fence) + 1
+        if body_start:
+            body_end = response_text.find("```", body_start)
+            if body_end == -1:
+                body_end = len(response_text)
+            if response_text[body_start:body_end].strip():
+                response_text = response_text[body_start:body_end]
+
+    # Find JSON object in response if there's extra text
+    start_idx = response_text.find("{")
+    end_idx = response_text.rfind("}") + 1
+    if start_idx != -1 and end_idx > start_idx:
+        response_text = response_text[start_idx:end_idx]
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("JSON to parse: %s", response_text[:500])
+    data = orjson.loads(response_text)
+
+    return {
+        "vendor_name": data.get("vendor_name"),
+        "category": data.get("category", "other"),
+        "date": data.get("date"),
+        "total_amount": data.get("total_amount"),
+        "extraction_success": True
+    }
+
+
+async def extract_bill_data(image_path: str) -> dict:
+    """
+    Extract bill data from an image using NVIDIA's Kimi K2.5 vision model.
+
+    Encoding the image and parsing the response run in worker threads so only
+    the HTTP request itself is awaited on the event loop. At most
+    MAX_CONCURRENT_EXTRACTIONS run at once; further uploads wait their turn.
+
+    Returns a dict with: vendor_name, category, date, total_amount
+    """
+    if NVIDIA_API_KEY is None:
+        raise ValueError("NVIDIA API key not initialized. Call init_client() first.")
+
+    async with _slots:
+        return await _extract(image_path)
+
+
+async def _extract(image_path: str) -> dict:
+    body = await asyncio.to_thread(_build_payload, image_path)
+
+    try:
+        content = await _post(body)
+        return await asyncio.to_thread(_parse, content)
+
+    except orjson.JSONDecodeError as e:
+        logger.warning("Could not decode bill JSON: %s", e)
         return {
             "vendor_name": None,
             "category": "other",
@@ -160,8 +220,8 @@ def extract_bill_data(image_path: str) -> dict:
             "extraction_success": False,
             "error": "Could not parse bill data. Please fill in the details manually."
         }
-    except requests.exceptions.RequestException as e:
-        print(f"[DEBUG] Request error: {e}")
+    except httpx.HTTPError as e:
+        logger.warning("NVIDIA API request failed: %s", e)
         return {
             "vendor_name": None,
             "category": "other",
@@ -171,9 +231,7 @@ def extract_bill_data(image_path: str) -> dict:
             "error": f"API request failed: {str(e)}"
         }
     except Exception as e:
-        print(f"[DEBUG] General error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Bill extraction failed")
         return {
             "vendor_name": None,
             "category": "other",
@@ -1,52 +1,212 @@
+import asyncio
+import datetime
+import logging
 import os
-import uuid
+import secrets
+import time
+import blake3
+import cachetools
 import httpx
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, Query, Request, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, validator
-from typing import Optional, List
+from fastapi.responses import FileResponse, ORJSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Annotated, Optional
 from dotenv import load_dotenv
 
-from database import init_db, insert_bill, get_all_bills, delete_bill, get_insights
-from extractor import init_client, extract_bill_data
-
-# Load environment variables
+# Load environment variables (before importing database, which picks its
+# driver from DATABASE_URL at import time)
 load_dotenv()
 
+from database import (
+    create_pool, close_pool, init_db, insert_bill, get_all_bills, delete_bill, get_insights,
+    get_extraction, save_extraction, BillNotFound
+)
+from extractor import init_client, close_client, extract_bill_data
+
+# Debug output stays off unless the level is lowered
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 # Initialize FastAPI app
-app = FastAPI(title="Bill Tracker API")
+app = FastAPI(title="Bill Tracker API", default_response_class=ORJSONResponse)
+
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+# Allowance for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 16 * 1024
+MAX_REQUEST_SIZE = MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD
+
+
+class BodySizeLimitMiddleware:
+    """Reject request bodies over max_size with a 413.
+
+    A declared Content-Length is checked before the app runs; bodies without
+    one (chunked) are counted as they stream in.
+    """
+
+    def __init__(self, app, max_size: int):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > self.max_size:
+                    response = ORJSONResponse({"detail": "Request body too large"}, status_code=413)
+                    return await response(scope, receive, send)
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class InternalErrorMiddleware:
+    """Log unhandled exceptions and answer them with a generic 500.
+
+    Routes don't wrap their bodies in try/except. An
+    exception_handler(Exception) would run in ServerErrorMiddleware, outside
+    CORS, and its 500s would reach a cross-origin frontend as opaque network
+    errors; this runs inside CORS instead.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        response_started = False
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, tracking_send)
+        except Exception:
+            logger.exception("Unhandled error on %s %s", scope["method"], scope["path"])
+            if response_started:
+                raise
+            response = ORJSONResponse({"detail": "Internal server error"}, status_code=500)
+            await response(scope, receive, send)
+
+
+# Added before CORS so that 413 and 500 responses still carry the CORS headers
+app.add_middleware(InternalErrorMiddleware)
+app.add_middleware(BodySizeLimitMiddleware, max_size=MAX_REQUEST_SIZE)
+
+# CORS configuration. The frontend sends no cookies or auth headers, so
+# credentials stay off; that keeps a "*" default spec-compliant and lets
+# Starlette answer with a static header instead of echoing the origin.
+# Set CORS_ORIGINS (comma-separated) to pin the allowed frontend origins.
+CORS_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip()]
 
-# CORS configuration
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=CORS_ORIGINS,
+    allow_credentials=False,
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,
 )
 
 # Create uploads directory if it doesn't exist
 UPLOADS_DIR = os.path.join(os.path.dirname(__file__), "uploads")
 os.makedirs(UPLOADS_DIR, exist_ok=True)
 
-# Mount uploads directory for serving images
-app.mount("/uploads", StaticFiles(directory=UPLOADS_DIR), name="uploads")
+# Uploads are copied to disk and hashed in one threadpool call, capped in size
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Recent extractions by upload content hash; misses fall back to the
+# bill_extractions table
+extraction_cache = cachetools.LRUCache(maxsize=1024)
+# How long a finished extraction job is kept in this worker; after that,
+# polls are answered from the bill_extractions table
+EXTRACTION_JOB_TTL = 300
+# A pending job older than this is reported as failed: the worker running
+# it died before it could record an outcome. Extractor calls time out at
+# 60 s, plus time spent waiting for an extraction slot.
+EXTRACTION_PENDING_LIMIT = 120
+
+ALLOWED_EXTENSIONS = frozenset((".jpg", ".jpeg", ".png", ".gif", ".webp"))
+# Declared types that are accepted; generic or missing types (some mobile
+# browsers, curl -F) are left to the magic-byte check
+ALLOWED_CONTENT_TYPES = frozenset((
+    "image/jpeg", "image/png", "image/gif", "image/webp", "application/octet-stream", "", None
+))
+
+# Leading bytes of each accepted image format, mapped to the extension the
+# file is saved under (the extractor derives the MIME type from it)
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+
+
+def detect_image_type(header: bytes) -> Optional[str]:
+    """Return the extension for an image's first 12 bytes, or None if unrecognized."""
+    for signature, ext in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return ext
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+# Environment is read once at import (after load_dotenv) rather than per request
+NVIDIA_API_KEY = os.environ.get("NVIDIA_API_KEY")
+GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
+
+GITHUB_API_URL = "https://api.github.com"
+GH_REPO = ("Paawan13", "bill_tracker")
+GH_ISSUES_PATH = f"/repos/{GH_REPO[0]}/{GH_REPO[1]}/issues"
+GITHUB_HEADERS = {
+    "Accept": "application/vnd.github.v3+json",
+    "X-GitHub-Api-Version": "2022-11-28"
+}
+if GITHUB_TOKEN:
+    GITHUB_HEADERS["Authorization"] = f"token {GITHUB_TOKEN}"
+
+# Per issue type: (title label, body header, GitHub labels)
+ISSUE_META = {
+    issue_type: (label, f"## {label}\n\n", [issue_type])
+    for issue_type, label in (
+        ("bug", "Bug Report"),
+        ("enhancement", "Feature Request"),
+        ("question", "Question"),
+    )
+}
+DEFAULT_ISSUE_META = ("Issue", "## Issue\n\n", [])
 
 
 class BillCreate(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
     vendor: str
     category: str
-    date: str
-    amount: float
+    date: datetime.date
+    amount: Annotated[float, Field(gt=0)]
     image_path: str
 
-    @validator("amount")
-    def amount_must_be_positive(cls, v):
-        if v <= 0:
-            raise ValueError("Amount must be a positive number")
-        return v
-
 
 class IssueReport(BaseModel):
     title: str
@@ -57,59 +217,259 @@ class IssueReport(BaseModel):
     screenshot: Optional[str] = None  # base64 encoded image
 
 
+def save_upload(src, ext: str) -> Optional[str]:
+    """
+    Copy an upload to disk in one blocking call, hashing it with BLAKE3 on
+    the way, and store it as <digest><ext>. Returns the digest, or None if
+    the upload is over MAX_UPLOAD_SIZE.
+
+    The bytes go to a temporary name first and are renamed into place, so
+    concurrent uploads of the same image never expose a partial file. If
+    the image is already stored, the new copy is discarded.
+    """
+    hasher = blake3.blake3()
+    size = 0
+    tmp_path = os.path.join(UPLOADS_DIR, f".{secrets.token_hex(8)}.part")
+    try:
+        with open(tmp_path, "wb") as f:
+            while chunk := src.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_SIZE:
+                    break
+                hasher.update(chunk)
+                f.write(chunk)
+        if size > MAX_UPLOAD_SIZE:
+            os.remove(tmp_path)
+            return None
+
+        digest = hasher.hexdigest()
+        file_path = os.path.join(UPLOADS_DIR, f"{digest}{ext}")
+        if os.path.exists(file_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, file_path)
+        return digest
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@app.exception_handler(BillNotFound)
+async def bill_not_found_handler(request: Request, exc: BillNotFound):
+    return ORJSONResponse({"detail": "Bill not found"}, status_code=404)
+
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database and NVIDIA API client on startup."""
-    init_db()
-    api_key = os.getenv("NVIDIA_API_KEY")
-    if api_key:
-        init_client(api_key)
+    """Initialize database pool, GitHub client and NVIDIA API client on startup."""
+    app.state.pool = await create_pool()
+    await init_db(app.state.pool)
+    # One HTTP/2 client for all outbound calls (GitHub, NVIDIA) so
+    # connections are pooled and concurrent requests multiplex over them
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=60),
+        timeout=httpx.Timeout(10.0, connect=5.0),
+    )
+    if NVIDIA_API_KEY:
+        init_client(NVIDIA_API_KEY, app.state.http)
     else:
-        print("Warning: NVIDIA_API_KEY not found in environment variables")
+        logger.warning("NVIDIA_API_KEY not found in environment variables")
+    if not GITHUB_TOKEN:
+        logger.warning("GITHUB_TOKEN not found in environment variables, /report-issue is disabled")
+    # Background extraction jobs by upload content hash
+    app.state.extractions = {}
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Cancel pending extractions and close the database pool and HTTP clients on shutdown."""
+    tasks = list(app.state.extractions.values())
+    for task in tasks:
+        task.cancel()
+    # Let cancelled jobs record their failure before the pool goes away
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await close_pool(app.state.pool)
+    await close_client()
+    await app.state.http.aclose()
+
+
+@app.get("/uploads/{filename}")
+async def get_upload(filename: str):
+    """
+    Serve a stored bill image. In production, let the reverse proxy serve
+    /uploads/ straight from disk instead (see README).
+    """
+    # Stored names are generated server-side; anything else is not ours
+    if filename.startswith(".") or os.path.basename(filename) != filename:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    path = os.path.join(UPLOADS_DIR, filename)
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    # Passing the stat result saves FileResponse a second stat; names are
+    # content hashes, so browsers may cache them indefinitely
+    return FileResponse(
+        path,
+        stat_result=stat_result,
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
 
 
 @app.post("/upload")
 async def upload_bill(file: UploadFile = File(...)):
     """
-    Upload a bill image, extract data using AI, and return extracted data.
+    Upload a bill image and return its extracted data.
     Does NOT save to database - client must call POST /bills to save.
+
+    A previously seen image is answered right away. Otherwise extraction runs
+    in the background and the 202 response carries a job_id to poll with
+    GET /upload/{job_id}.
     """
-    print(f"[DEBUG] Upload endpoint called with file: {file.filename}")
+    logger.debug("Upload endpoint called with file: %s", file.filename)
+
+    # Oversize request bodies are already refused by BodySizeLimitMiddleware;
+    # this catches a file that is over the cap on its own
+    if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail="File too large. Maximum size is 10 MB")
 
     # Validate file type
-    allowed_extensions = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
-    ext = os.path.splitext(file.filename)[1].lower()
-    if ext not in allowed_extensions:
+    name = file.filename or ""
+    dot = name.rfind(".")
+    ext = name[dot:].lower() if dot >= 0 else ""
+    if ext not in ALLOWED_EXTENSIONS or file.content_type not in ALLOWED_CONTENT_TYPES:
         raise HTTPException(status_code=400, detail="Invalid file type. Allowed: jpg, jpeg, png, gif, webp")
 
-    # Generate unique filename
-    unique_filename = f"{uuid.uuid4()}{ext}"
-    file_path = os.path.join(UPLOADS_DIR, unique_filename)
+    # Check the content really is an image; the extension alone is not trusted
+    ext = detect_image_type(await file.read(12))
+    if ext is None:
+        raise HTTPException(status_code=400, detail="File content is not a supported image")
+    await file.seek(0)
 
-    # Save the file
+    # Save and hash the file in one pass without buffering it whole in
+    # memory. It is named by its content, so a re-uploaded receipt maps to
+    # the same file and its earlier extraction
     try:
-        contents = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(contents)
+        digest = await run_in_threadpool(save_upload, file.file, ext)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+    if digest is None:
+        raise HTTPException(status_code=413, detail="File too large. Maximum size is 10 MB")
 
-    # Extract bill data using AI
+    unique_filename = f"{digest}{ext}"
+    file_path = os.path.join(UPLOADS_DIR, unique_filename)
+
+    image_path = f"/uploads/{unique_filename}"
+
+    # Reuse a previous successful extraction of the same image, skipping the
+    # AI call; a stored failure or pending job does not count
+    extracted_data = extraction_cache.get(digest)
+    if extracted_data is None:
+        extracted_data = await get_extraction(app.state.pool, digest)
+        if extracted_data is not None and extracted_data.get("extraction_success"):
+            extraction_cache[digest] = extracted_data
+    if extracted_data is not None and extracted_data.get("extraction_success"):
+        return {"image_path": image_path, "extraction_pending": False, **extraction_fields(extracted_data)}
+
+    # Otherwise extract in the background and let the client poll; a second
+    # upload of the same image while that runs joins the same job
+    jobs = app.state.extractions
+    task = jobs.get(digest)
+    if task is None or task.done():
+        # Registered before any await, so concurrent uploads of the same
+        # image find this task instead of starting their own
+        task = asyncio.create_task(run_extraction(digest, file_path))
+        jobs[digest] = task
+        task.add_done_callback(lambda t: asyncio.get_running_loop().call_later(
+            EXTRACTION_JOB_TTL, forget_job, digest, t
+        ))
+
+    return ORJSONResponse(
+        {"image_path": image_path, "extraction_pending": True, "job_id": digest},
+        status_code=202
+    )
+
+
+@app.get("/upload/{job_id}")
+async def get_upload_extraction(job_id: str):
+    """Poll a background extraction started by POST /upload."""
+    task = app.state.extractions.get(job_id)
+    if task is not None:
+        if not task.done():
+            return {"done": False, "result": None}
+        if task.cancelled():
+            return {"done": True, "result": extraction_fields(failed_extraction("Extraction was cancelled"))}
+        return {"done": True, "result": extraction_fields(task.result())}
+
+    # The job may have run in another worker, or finished long enough ago to
+    # be forgotten here; its state is shared through the bill_extractions table
+    extracted_data = extraction_cache.get(job_id)
+    if extracted_data is None:
+        extracted_data = await get_extraction(app.state.pool, job_id)
+    if extracted_data is None:
+        raise HTTPException(status_code=404, detail="Extraction job not found")
+    if extracted_data.get("extraction_pending"):
+        if time.time() - extracted_data.get("started_at", 0) < EXTRACTION_PENDING_LIMIT:
+            return {"done": False, "result": None}
+        return {"done": True, "result": extraction_fields(failed_extraction("Extraction did not finish"))}
+    return {"done": True, "result": extraction_fields(extracted_data)}
+
+
+async def run_extraction(digest: str, file_path: str) -> dict:
+    """Extract bill data from a saved upload and store the outcome."""
     try:
-        extracted_data = extract_bill_data(file_path)
+        # Mark the job as pending in the shared table, so a poll that lands
+        # on another worker knows the job exists
+        await store_extraction(digest, {"extraction_pending": True, "started_at": time.time()})
+        extracted_data = await extract_bill_data(file_path)
+    except asyncio.CancelledError:
+        # Shutdown cancels running jobs; record the failure so pollers on
+        # other workers stop waiting, then let the cancellation through
+        await store_extraction(digest, failed_extraction("Extraction was cancelled"))
+        raise
     except Exception as e:
-        extracted_data = {
-            "vendor_name": None,
-            "category": "other",
-            "date": None,
-            "total_amount": None,
-            "extraction_success": False,
-            "error": str(e)
-        }
-
-    # Return extracted data with image path
+        extracted_data = failed_extraction(str(e))
+    # Failures are stored too, so pollers on other workers see the job end;
+    # only successes are reused by later uploads
+    if extracted_data.get("extraction_success"):
+        extraction_cache[digest] = extracted_data
+    await store_extraction(digest, extracted_data)
+    return extracted_data
+
+
+async def store_extraction(digest: str, extracted_data: dict):
+    """Record a job's state in bill_extractions, logging rather than raising on failure."""
+    try:
+        await save_extraction(app.state.pool, digest, extracted_data)
+    except Exception:
+        logger.exception("Failed to store extraction for %s", digest)
+
+
+def failed_extraction(error: str) -> dict:
+    """An extraction result for a job that did not succeed."""
+    return {
+        "vendor_name": None,
+        "category": "other",
+        "date": None,
+        "total_amount": None,
+        "extraction_success": False,
+        "error": error
+    }
+
+
+def forget_job(digest: str, task: asyncio.Task):
+    """Drop a finished job unless it has been replaced by a newer one."""
+    if app.state.extractions.get(digest) is task:
+        del app.state.extractions[digest]
+
+
+def extraction_fields(extracted_data: dict) -> dict:
+    """The client-facing subset of an extraction result."""
     return {
-        "image_path": f"/uploads/{unique_filename}",
         "vendor_name": extracted_data.get("vendor_name"),
         "category": extracted_data.get("category", "other"),
         "date": extracted_data.get("date"),
@@ -119,115 +479,102 @@ async def upload_bill(file: UploadFile = File(...)):
     }
 
 
+# Data endpoints return their responses directly: the database layer already
+# hands back plain dicts, so FastAPI's jsonable_encoder pass is skipped and
+# orjson encodes dates and datetimes natively.
 @app.post("/bills")
 async def create_bill(bill: BillCreate):
     """Save a bill to the database."""
-    try:
-        saved_bill = insert_bill(
-            date=bill.date,
-            vendor=bill.vendor,
-            category=bill.category,
-            amount=bill.amount,
-            image_path=bill.image_path
-        )
-        return saved_bill
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save bill: {str(e)}")
+    saved_bill = await insert_bill(
+        app.state.pool,
+        date=bill.date,
+        vendor=bill.vendor,
+        category=bill.category,
+        amount=bill.amount,
+        image_path=bill.image_path
+    )
+    return ORJSONResponse(saved_bill)
 
 
 @app.get("/bills")
-async def list_bills():
-    """Get all bills ordered by date descending."""
-    try:
-        bills = get_all_bills()
-        return bills
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch bills: {str(e)}")
+async def list_bills(limit: Optional[int] = Query(None, ge=1), offset: int = Query(0, ge=0)):
+    """Get bills ordered by date descending, optionally one page at a time."""
+    # The page is fetched before the response starts, so a database error
+    # is still a proper 500 rather than a truncated 200 body
+    bills = await get_all_bills(app.state.pool, limit, offset)
+    return ORJSONResponse(bills)
 
 
 @app.delete("/bills/{bill_id}")
 async def remove_bill(bill_id: int):
     """Delete a bill by ID."""
-    try:
-        deleted = delete_bill(bill_id)
-        if not deleted:
-            raise HTTPException(status_code=404, detail="Bill not found")
-        return {"message": "Bill deleted successfully"}
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to delete bill: {str(e)}")
+    await delete_bill(app.state.pool, bill_id)
+    return {"message": "Bill deleted successfully"}
 
 
 @app.get("/insights")
-async def get_spending_insights():
-    """Get spending insights and statistics."""
-    try:
-        insights = get_insights()
-        return insights
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch insights: {str(e)}")
+async def get_spending_insights(request: Request):
+    """
+    Get spending insights and statistics. Responses carry an ETag so a
+    dashboard poll with unchanged data gets an empty 304.
+    """
+    # no-cache makes the browser revalidate with If-None-Match on every fetch.
+    # The ETag follows the data generation, so an unchanged dashboard costs
+    # one cheap query and a cache hit.
+    insights, etag = await get_insights(app.state.pool)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse(insights, headers=headers)
+
+
+async def gh_post(path: str, json: dict) -> httpx.Response:
+    """POST to the GitHub API through the shared client."""
+    return await app.state.http.post(GITHUB_API_URL + path, headers=GITHUB_HEADERS, json=json)
 
 
 @app.post("/report-issue")
 async def report_issue(issue: IssueReport):
     """Create a GitHub issue for bug reports or feature requests."""
-    github_token = os.getenv("GITHUB_TOKEN")
-    if not github_token:
+    if not GITHUB_TOKEN:
         raise HTTPException(status_code=500, detail="GitHub token not configured")
 
-    # GitHub repo details
-    repo_owner = "Paawan13"
-    repo_name = "bill_tracker"
-
     # Build issue body
-    type_labels = {
-        "bug": "Bug Report",
-        "enhancement": "Feature Request",
-        "question": "Question"
-    }
-
-    body = f"## {type_labels.get(issue.issue_type, 'Issue')}\n\n"
+    type_label, header, labels = ISSUE_META.get(issue.issue_type, DEFAULT_ISSUE_META)
+    parts = [header]
 
     if issue.description:
-        body += f"### Description\n{issue.description}\n\n"
+        parts.append(f"### Description\n{issue.description}\n\n")
 
     if issue.environment:
-        body += f"### Environment\n{issue.environment}\n\n"
+        parts.append(f"### Environment\n{issue.environment}\n\n")
 
     if issue.console_logs:
-        body += f"### Console Logs\n```\n{issue.console_logs}\n```\n\n"
+        parts.append(f"### Console Logs\n```\n{issue.console_logs}\n```\n\n")
 
-    # Prepare labels
-    labels = [issue.issue_type] if issue.issue_type in ["bug", "enhancement", "question"] else []
+    body = "".join(parts)
 
     # Create issue via GitHub API
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"https://api.github.com/repos/{repo_owner}/{repo_name}/issues",
-                headers={
-                    "Authorization": f"token {github_token}",
-                    "Accept": "application/vnd.github.v3+json",
-                    "X-GitHub-Api-Version": "2022-11-28"
-                },
-                json={
-                    "title": f"[{type_labels.get(issue.issue_type, 'Issue')}] {issue.title}",
-                    "body": body,
-                    "labels": labels
-                }
-            )
-
-            if response.status_code == 201:
-                issue_data = response.json()
-                return {
-                    "success": True,
-                    "issue_number": issue_data["number"],
-                    "issue_url": issue_data["html_url"]
-                }
-            else:
-                error_detail = response.json().get("message", "Unknown error")
-                raise HTTPException(status_code=response.status_code, detail=f"GitHub API error: {error_detail}")
+        response = await gh_post(
+            GH_ISSUES_PATH,
+            {
+                "title": f"[{type_label}] {issue.title}",
+                "body": body,
+                "labels": labels
+            }
+        )
+
+        if response.status_code == 201:
+            issue_data = response.json()
+            return {
+                "success": True,
+                "issue_number": issue_data["number"],
+                "issue_url": issue_data["html_url"]
+            }
+        else:
+            error_detail = response.json().get("message", "Unknown error")
+            raise HTTPException(status_code=response.status_code, detail=f"GitHub API error: {error_detail}")
 
     except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"Failed to connect to GitHub: {str(e)}")
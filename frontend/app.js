@@ -236,11 +236,16 @@ async function extractBill(file) {
             throw new Error('Failed to upload image');
         }
 
-        const data = await response.json();
+        const upload = await response.json();
 
         // Store image path
-        currentImagePath = data.image_path;
-        document.getElementById('image-path').value = data.image_path;
+        currentImagePath = upload.image_path;
+        document.getElementById('image-path').value = upload.image_path;
+
+        // New images are extracted in the background; wait for the result
+        const data = upload.extraction_pending
+            ? await pollExtraction(upload.job_id)
+            : upload;
 
         // Show warning if extraction failed
         if (!data.extraction_success) {
@@ -274,6 +279,29 @@ async function extractBill(file) {
     }
 }
 
+const EXTRACTION_POLL_INTERVAL = 1000;
+const EXTRACTION_POLL_TIMEOUT = 90000;
+
+async function pollExtraction(jobId) {
+    const deadline = Date.now() + EXTRACTION_POLL_TIMEOUT;
+
+    while (Date.now() < deadline) {
+        await new Promise(resolve => setTimeout(resolve, EXTRACTION_POLL_INTERVAL));
+
+        const response = await fetch(`${API_URL}/upload/${encodeURIComponent(jobId)}`);
+        if (!response.ok) {
+            throw new Error('Failed to check extraction');
+        }
+
+        const job = await response.json();
+        if (job.done) {
+            return job.result;
+        }
+    }
+
+    throw new Error('Extraction timed out');
+}
+
 function getTodayDate() {
     return new Date().toISOString().split('T')[0];
 }